@@ -1,6 +1,41 @@
-import itertools
+import heapq
 import random
 
+from collections import defaultdict
+
+
+def iter_bits(mask):
+    """
+    Yields each set bit of a bitmask as an int of its own.
+    """
+    while mask:
+        bit = mask & -mask
+        yield bit
+        mask ^= bit
+
+
+def neighbor_masks(height, width):
+    """
+    Returns a list holding, for each cell index i * width + j,
+    the bitmask of the neighbors of cell (i, j).
+    """
+    board = (1 << (height * width)) - 1
+
+    # Every column but the first, and every column but the last, so that
+    # shifting a bit sideways can't wrap it around onto the next row
+    not_first = 0
+    for i in range(height):
+        not_first |= ((1 << width) - 2) << (i * width)
+    not_last = not_first >> 1
+
+    masks = []
+    for index in range(height * width):
+        bit = 1 << index
+        row = bit | ((bit << 1) & not_first) | ((bit >> 1) & not_last)
+        block = (row | (row << width) | (row >> width)) & board
+        masks.append(block ^ bit)
+    return masks
+
 
 class Minesweeper():
     """
@@ -14,21 +49,20 @@ class Minesweeper():
         self.width = width
         self.mines = set()
 
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        # Initialize an empty field with no mines, stored as a bitboard:
+        # cell (i, j) is bit i * width + j
+        self.board = 0
+
+        # Add mines randomly, drawing distinct cells so no draw is wasted
+        for index in random.sample(range(height * width), mines):
+            self.mines.add(divmod(index, width))
+            self.board |= 1 << index
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # The mines never move, so count each cell's nearby mines once up front
+        self.counts = [
+            (mask & self.board).bit_count()
+            for mask in neighbor_masks(self.height, self.width)
+        ]
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -41,7 +75,7 @@ class Minesweeper():
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if self.is_mine((i, j)):
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -50,7 +84,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return bool(self.board >> (i * self.width + j) & 1)
 
     def nearby_mines(self, cell):
         """
@@ -58,24 +92,8 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        i, j = cell
+        return self.counts[i * self.width + j]
 
     def won(self):
         """
@@ -87,52 +105,69 @@ class Minesweeper():
 class Sentence():
     """
     Logical statement about a Minesweeper game
-    A sentence consists of a set of board cells,
+    A sentence consists of a bitmask of board cells,
     and a count of the number of those cells which are mines.
     """
 
     def __init__(self, cells, count):
-        self.cells = set(cells)
+        self.cells = cells
         self.count = count
 
+        # Number of cells, kept up to date by every update to self.cells
+        self.size = cells.bit_count()
+
     def __eq__(self, other):
-        return self.cells == other.cells and self.count == other.count
+        return self is other or (self.cells == other.cells and self.count == other.count)
+
+    def __hash__(self):
+        return hash((self.cells, self.count))
 
     def __str__(self):
-        return f"{self.cells} = {self.count}"
+        return f"{self.cells:b} = {self.count}"
 
     def known_mines(self):
         """
-        Returns the set of all cells in self.cells known to be mines.
+        Returns the bitmask of all cells in self.cells known to be mines.
         """
-        if len(self.cells) == self.count:
+        if self.size == self.count:
             return self.cells
+        return 0
 
     def known_safes(self):
         """
-        Returns the set of all cells in self.cells known to be safe.
+        Returns the bitmask of all cells in self.cells known to be safe.
         """
-        if self.cells == 0:
+        if self.count == 0:
             return self.cells
+        return 0
 
-    def mark_mine(self, cell):
+    def mark_mine(self, cells):
         """
         Updates internal knowledge representation given the fact that
-        a cell is known to be a mine.
+        the cells in a bitmask are known to be mines.
         """
-        if cell in self.cells:
-            self.cells.discard(cell)
-            self.count -= 1
-
+        hit = self.cells & cells
+        mines = hit.bit_count()
+        self.cells ^= hit
+        self.size -= mines
+        self.count -= mines
 
-    def mark_safe(self, cell):
+    def mark_safe(self, cells):
         """
         Updates internal knowledge representation given the fact that
-        a cell is known to be safe.
+        the cells in a bitmask are known to be safe.
+        """
+        self.cells &= ~cells
+        self.size = self.cells.bit_count()
+
+    def remove_subset(self, other):
+        """
+        Updates internal knowledge representation given another sentence
+        whose cells are a subset of self.cells.
         """
-        if cell in self.cells:
-            self.cells.discard(cell)
-            
+        self.cells &= ~other.cells
+        self.size -= other.size
+        self.count -= other.count
 
 
 class MinesweeperAI():
@@ -153,38 +188,126 @@ class MinesweeperAI():
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Bitmasks of the cells known to be mines, and known either way
+        # (cells clicked on are always marked safe)
+        self.mines_mask = 0
+        self.known_mask = 0
+
+        # Keep track of cells neither clicked on nor known to be mines
+        self.available = {(i, j) for i in range(self.height) for j in range(self.width)}
+
+        # Map each cell to its bit in a sentence's bitmask, and back
+        self.cell_bit = {}
+        self.bit_cell = {}
+        for i in range(self.height):
+            for j in range(self.width):
+                bit = 1 << (i * self.width + j)
+                self.cell_bit[(i, j)] = bit
+                self.bit_cell[bit] = (i, j)
+
+        # Bitmask of the neighbors of each cell, computed once instead of on every move
+        self.neighbor_masks = neighbor_masks(self.height, self.width)
+
+        # Sentences about the game known to be true, keyed by their cells
+        self.knowledge = {}
+
+        # Cells of the sentences in the knowledge base that contain each cell bit
+        self.cell_to_sentences = defaultdict(set)
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base, unless it has no cells
+        or a sentence about the same cells is already known.
+
+        Returns whether the sentence was added.
+        """
+        if not sentence.cells or sentence.cells in self.knowledge:
+            return False
+        self.knowledge[sentence.cells] = sentence
+        for bit in iter_bits(sentence.cells):
+            self.cell_to_sentences[bit].add(sentence.cells)
+        return True
+
+    def remove_sentence(self, cells):
+        """
+        Removes and returns the sentence about the given cells
+        from the knowledge base.
+        """
+        sentence = self.knowledge.pop(cells)
+        for bit in iter_bits(cells):
+            self.cell_to_sentences[bit].discard(cells)
+        return sentence
 
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
+
+        Returns the cells of the sentences that were updated.
         """
-        self.mines.add(cell)
-        empty = []
-        copy_knowledge = self.knowledge.copy()
-        for sentence in copy_knowledge:
-            sentence.mark_mine(cell)
-            if len(sentence.cells) == 0:
-                empty.append(sentence)
-        for sentence in empty:
-            self.knowledge.remove(sentence)
+        return self.mark_mines(self.cell_bit[cell])
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
+
+        Returns the cells of the sentences that were updated.
+        """
+        return self.mark_safes(self.cell_bit[cell])
+
+    def mark_mines(self, cells):
+        """
+        Marks every cell in a bitmask as a mine, updating each
+        sentence that contains any of them once.
+
+        Returns the cells of the sentences that were updated.
+        """
+        self.mines_mask |= cells
+        self.known_mask |= cells
+        affected = set()
+        for bit in iter_bits(cells):
+            cell = self.bit_cell[bit]
+            self.mines.add(cell)
+            self.available.discard(cell)
+            affected |= self.cell_to_sentences.get(bit, set())
+
+        changed = set()
+        for key in affected:
+            sentence = self.remove_sentence(key)
+            sentence.mark_mine(cells)
+            self.add_sentence(sentence)
+            changed.add(sentence.cells)
+
+        # no sentence mentions these cells any more
+        for bit in iter_bits(cells):
+            self.cell_to_sentences.pop(bit, None)
+        return changed
+
+    def mark_safes(self, cells):
+        """
+        Marks every cell in a bitmask as safe, updating each
+        sentence that contains any of them once.
+
+        Returns the cells of the sentences that were updated.
         """
-        self.safes.add(cell)
-        empty = []
-        copy_knowledge = self.knowledge.copy()
-        for sentence in copy_knowledge:
-            sentence.mark_safe(cell)
-            if len(sentence.cells) == 0:
-                empty.append(sentence)
-        for sentence in empty:
-            self.knowledge.remove(sentence)
+        self.known_mask |= cells
+        affected = set()
+        for bit in iter_bits(cells):
+            self.safes.add(self.bit_cell[bit])
+            affected |= self.cell_to_sentences.get(bit, set())
+
+        changed = set()
+        for key in affected:
+            sentence = self.remove_sentence(key)
+            sentence.mark_safe(cells)
+            self.add_sentence(sentence)
+            changed.add(sentence.cells)
+
+        # no sentence mentions these cells any more
+        for bit in iter_bits(cells):
+            self.cell_to_sentences.pop(bit, None)
+        return changed
 
     def add_knowledge(self, cell, count):
         """
@@ -201,51 +324,46 @@ class MinesweeperAI():
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
         """
-        # 1) mark the cell as a move that has been made
-        self.moves_made.add(cell)
+        self.add_knowledge_bulk([(cell, count)])
 
-        # 2) mark the cell as safe
-        self.mark_safe(cell)
-
-        # 3) add a new sentence to the AI's knowledge base based on the value of `cell` and `count`
-        # find out neighbors
-        i, j = cell
-        neighbor_cells = set()
-        for row in range(i - 1, i + 2):
-            for col in range(j - 1, j + 2):
-                if 0 <= row < self.height and 0 <= col < self.width and (row, col) != cell:
-                    neighbor_cells.add((row, col))
-
-        # remove already clicked cells from neigbors
-        cells = set()
-        for neighbor in neighbor_cells:
-            if neighbor not in (self.moves_made or self.mines or self.safes):
-                cells.add(neighbor)
-            elif neighbor in self.mines:
-                count -= 1
-
-        # check if all neighbors are safe
-        if count == 0:
-            for neighbor in cells:
-                self.safes.add(neighbor)
-                self.mark_safe(neighbor)
-        # check if all neighbors are mines
-        elif len(cells) == count:
-            for neighbor in cells:
-                self.mines.add(neighbor)
-                self.mark_mine(neighbor)
-        
-        # add new sentence to knowledge
-        new_sentence = Sentence(cells, count)
-        self.knowledge.append(new_sentence)
+    def add_knowledge_bulk(self, reveals):
+        """
+        Like add_knowledge, for a list of (cell, count) pairs revealed
+        together, e.g. by a cascade of cells with no nearby mines.
+        Steps 1) to 3) are done for every cell first, so that 4) and 5)
+        only have to run once for the whole batch.
+        """
+        changed = set()
+        for cell, count in reveals:
+            # 1) mark the cell as a move that has been made
+            self.moves_made.add(cell)
+            self.available.discard(cell)
+
+            # 2) mark the cell as safe
+            changed |= self.mark_safe(cell)
+
+            # 3) add a new sentence to the AI's knowledge base based on the value of `cell` and `count`
+            # remove already clicked, safe and mine cells from neighbors
+            i, j = cell
+            neighbors = self.neighbor_masks[i * self.width + j]
+            count -= (neighbors & self.mines_mask).bit_count()
+            cells = neighbors & ~self.known_mask
+
+            # check if all neighbors are safe
+            if count == 0:
+                changed |= self.mark_safes(cells)
+            # check if all neighbors are mines
+            elif cells.bit_count() == count:
+                changed |= self.mark_mines(cells)
+            # otherwise add new sentence to knowledge, unless it is already known
+            elif self.add_sentence(Sentence(cells, count)):
+                changed.add(cells)
 
         # 4) mark any additional cells as safe or as mines if it can be concluded based on the AI's knowledge base
-        self.mark_mines_safes()
-
         # 5) add any new sentences to the AI's knowledge base if they can be inferred from existing knowledge
-        self.draw_interferences()
-        
-
+        # only the sentences these moves changed can lead to new conclusions
+        if changed:
+            self.draw_interferences(changed)
 
     def make_safe_move(self):
         """
@@ -269,47 +387,71 @@ class MinesweeperAI():
             1) have not already been chosen, and
             2) are not known to be mines
         """
-        cells = []
-        for row in range(0, self.height):
-            for col in range(0, self.width):
-                cell = (row, col)
-                if cell not in self.moves_made and cell not in self.mines:
-                    cells.append(cell)
-        if cells:
-            return random.choice(cells)
+        if self.available:
+            return random.choice(tuple(self.available))
         else:
             return None
 
-    def mark_mines_safes(self):
-        copy_knowledge = self.knowledge.copy()
-        for sentence in copy_knowledge:
-            # all cells of the sentence are mines
-            if len(sentence.cells) == sentence.count:
-                copy_cells = sentence.cells.copy()
-                for cell in copy_cells:
-                    self.mark_mine(cell)
-            # all cells of the sentence are safe
-            elif sentence.count == 0:
-                copy_cells = sentence.cells.copy()
-                for cell in copy_cells:
-                    self.mark_safe(cell)
-
-
-    def draw_interferences(self):
-        drawn = True
-        
-        while drawn:
-            # comparing each sentence with each other in the knowledge base
-            copy_knowledge = self.knowledge.copy()
-            
-            drawn = False
-            for sentence1 in copy_knowledge:
-                for sentence2 in copy_knowledge:
-                    # check if sentences are disjunct and cells of sentence1 is subset of cells of sentence2
-                    if sentence1 != sentence2 and len(sentence1.cells) != 0 and len(sentence2.cells) != 0:
-                        if sentence1.cells.issubset(sentence2.cells):
-                            sentence2.cells = sentence2.cells.difference(sentence1.cells)
-                            sentence2.count = sentence2.count - sentence1.count
-                            drawn = True
-            
-            self.mark_mines_safes()
+    def mark_sentence(self, sentence):
+        """
+        Marks the cells of a sentence as mines or safes if they can be
+        concluded from the sentence alone, and returns the cells of the
+        sentences that were updated.
+        """
+        mines = sentence.known_mines()
+        safes = sentence.known_safes()
+        return self.mark_mines(mines) | self.mark_safes(safes)
+
+    def draw_interferences(self, dirty=None):
+        """
+        Draws every conclusion that follows from the sentences with the
+        given cells (all sentences by default), revisiting each sentence
+        that changes along the way until nothing more can be concluded.
+        """
+        if dirty is None:
+            dirty = self.knowledge
+
+        # sentences changed since they were last compared with the others,
+        # smallest first so they reduce the larger sentences early on
+        queue = [(self.knowledge[cells].size, cells) for cells in dirty if cells in self.knowledge]
+        heapq.heapify(queue)
+        queued = {cells for _, cells in queue}
+
+        while queue:
+            _, cells = heapq.heappop(queue)
+            queued.discard(cells)
+            sentence = self.knowledge.get(cells)
+            if sentence is None:
+                continue
+
+            changed = self.mark_sentence(sentence)
+
+            if cells in self.knowledge:
+                # sentences sharing a cell are the only ones that can be subsets
+                # or supersets of this one
+                related = set()
+                for bit in iter_bits(cells):
+                    related |= self.cell_to_sentences[bit]
+                related.discard(cells)
+
+                for other in related:
+                    other_sentence = self.knowledge.get(other)
+                    if other_sentence is None:
+                        continue
+                    if other_sentence.size > sentence.size and (other & cells) == cells:
+                        superset = self.remove_sentence(other)
+                        superset.remove_subset(sentence)
+                        self.add_sentence(superset)
+                        changed.add(superset.cells)
+                    elif other_sentence.size < sentence.size and (other & cells) == other:
+                        # this sentence changes, so it is compared again under its new cells
+                        sentence = self.remove_sentence(cells)
+                        sentence.remove_subset(other_sentence)
+                        self.add_sentence(sentence)
+                        changed.add(sentence.cells)
+                        break
+
+            for cells in changed:
+                if cells in self.knowledge and cells not in queued:
+                    queued.add(cells)
+                    heapq.heappush(queue, (self.knowledge[cells].size, cells))